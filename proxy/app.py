@@ -2,13 +2,21 @@ import json
 import subprocess
 import asyncio
 import os
+import time
 from contextlib import asynccontextmanager
 
+import anyio
 import httpx
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
 
 import proxy.utils as utils
 import proxy.metrics as metrics
+import proxy.usage as usage
+import proxy.responses as responses
+from proxy.request_store import RequestStore
+from proxy.tracing import NOOP_SPAN, tracer
+from proxy.upstream import Upstream, UpstreamConfig, UpstreamError
 
 TARGET_URL = "http://localhost:8000"  # inference gateway
 LISTEN_PORT = 8001
@@ -17,18 +25,27 @@ TARGET_PORT = 8000
 # PYTHON_TK_PATH = "proxy/clock/.venv/bin/python3.14"
 STOPWATCH_APP_PATH = "proxy/clock/app.py"
 
+upstream = Upstream(UpstreamConfig.from_env())
+usage_ledger = usage.UsageLedger()
+request_store = RequestStore()
+conversations = responses.ConversationStore()
+USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', 30))
+
 # Background task for updating metrics
 async def update_metrics_periodically():
     """Update metrics every 5 seconds from collector logs"""
     while True:
+        poll_span = NOOP_SPAN
         try:
             await asyncio.sleep(5)
+            poll_span = tracer.start_trace("metrics.poll")
             
             # Get the latest metrics from collector
             namespace = os.environ.get('NAMESPACE', 'sage')
             print(f"Fetching metrics from namespace: {namespace}")
             
-            collector_metrics = metrics.get_collector_metrics(namespace, tail_lines=10)
+            with tracer.span("metrics.collector_logs", parent=poll_span, namespace=namespace):
+                collector_metrics = metrics.get_collector_metrics(namespace, tail_lines=10)
             print(f"Found {len(collector_metrics) if collector_metrics else 0} collector metrics")
             
             if collector_metrics:
@@ -49,15 +66,16 @@ async def update_metrics_periodically():
                 
                 # Update the GUI via API
                 try:
-                    async with httpx.AsyncClient(timeout=5.0) as client:
-                        response = await client.get(
-                            "http://127.0.0.1:9000/metrics",
-                            params={
-                                "lookups": lookups,
-                                "admissions": admissions,
-                                "evictions": evictions
-                            }
-                        )
+                    with tracer.span("metrics.gui_update", parent=poll_span):
+                        async with httpx.AsyncClient(timeout=5.0) as client:
+                            response = await client.get(
+                                "http://127.0.0.1:9000/metrics",
+                                params={
+                                    "lookups": lookups,
+                                    "admissions": admissions,
+                                    "evictions": evictions
+                                }
+                            )
                         print(f"GUI update response: {response.status_code} - {response.text}")
                 except Exception as api_error:
                     print(f"Error updating GUI metrics: {api_error}")
@@ -69,76 +87,264 @@ async def update_metrics_periodically():
             import traceback
             traceback.print_exc()
             # Continue running even if there's an error
+        finally:
+            poll_span.end()
+
+async def flush_usage_periodically():
+    """Persist the token usage ledger every USAGE_FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(usage_ledger.flush)
+        except Exception as e:
+            print(f"Error flushing usage ledger: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Start the GUI application and metrics update task
     subprocess.Popen(["python", STOPWATCH_APP_PATH])
     task = asyncio.create_task(update_metrics_periodically())
+    usage_ledger.load()
+    usage_task = asyncio.create_task(flush_usage_periodically())
     
     yield
     
-    # Shutdown: Cancel the background task
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    # Shutdown: Cancel the background tasks and persist the usage ledger
+    for t in (task, usage_task):
+        t.cancel()
+        try:
+            await t
+        except asyncio.CancelledError:
+            pass
+    usage_ledger.flush()
+    tracer.exporter.shutdown()
+    request_store.close()
 
 app = FastAPI(lifespan=lifespan)
 
-@app.api_route("/v1/responses", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+class RelayResponse(StreamingResponse):
+    """StreamingResponse that always closes its body and runs `on_close`.
+
+    Starlette leaves the body generator suspended when the client disconnects,
+    so cleanup (stopping the stopwatch, closing the upstream stream) cannot
+    live in the generator's `finally`.
+    """
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+                await self.on_close()
+
+@app.api_route("/v1/responses", methods=["POST"])
 async def proxy_responses(request: Request):
-    print("Error: llm-d is not supporting The Responses API")
-    error_response = {
-        "error": {
-            "message": "llm-d is not supporting The Responses API",
-            "type": "not_supported_error",
-            "code": "responses_api_not_supported"
-        }
-    }
-    return Response(
-        content=json.dumps(error_response),
-        status_code=400,
-        headers={"Content-Type": "application/json"}
+    print(f"\n\033[1;33m--- Request: {request.method} /v1/responses ---\033[0m")
+
+    root = tracer.start_trace(
+        f"{request.method} /v1/responses",
+        traceparent=request.headers.get("traceparent"),
     )
+    try:
+        with root.activate():
+            with tracer.span("read_body") as span:
+                body = await request.body()
+                span.set("http.request.body.size", len(body))
+            with tracer.span("responses.translate_request"):
+                chat_body, translator = responses.translate_request(body, conversations)
+    except responses.ResponsesRequestError as e:
+        print(f"Error: {e}")
+        root.set("error", str(e))
+        root.end()
+        error_response = {
+            "error": {
+                "message": str(e),
+                "type": "invalid_request_error",
+                "code": e.code
+            }
+        }
+        return Response(
+            content=json.dumps(error_response),
+            status_code=400,
+            headers={"Content-Type": "application/json"}
+        )
+    except BaseException:
+        root.end()
+        raise
+
+    return await forward_chat_completion(request, root, body, chat_body, translator)
 
 @app.api_route("/v1/chat/completions", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def proxy_chat_completions(request: Request):
     print(f"\n\033[1;33m--- Request: {request.method} /v1/chat/completions ---\033[0m")
 
-    async with httpx.AsyncClient() as client:
-        await client.get("http://127.0.0.1:9000/reset")
-        await client.get("http://127.0.0.1:9000/start")
-
-        body = await request.body()
-
-        utils.log_request(request, body)
-        utils.print_request_messages(body)
-        
-        resp = await client.request(
-            request.method,
-            f"{TARGET_URL}/v1/chat/completions",
-            content=body,
-            headers=dict(request.headers),
-            timeout=None,
-        )
+    root = tracer.start_trace(
+        f"{request.method} /v1/chat/completions",
+        traceparent=request.headers.get("traceparent"),
+    )
+    try:
+        with root.activate(), tracer.span("read_body") as span:
+            body = await request.body()
+            span.set("http.request.body.size", len(body))
+    except BaseException:
+        root.end()
+        raise
 
-        await client.get("http://127.0.0.1:9000/stop")
+    return await forward_chat_completion(request, root, body, body)
 
-        elapsed = resp.elapsed.total_seconds()  # total round-trip time
-        
-        print(f"\n\033[1;33m--- Response: {resp.status_code} ---\033[0m")
+async def forward_chat_completion(request: Request, root, body: bytes, chat_body: bytes,
+                                  translator: responses.ResponsesTranslator | None = None) -> Response:
+    """Send `chat_body` upstream and stream the result back to the client.
 
-        utils.print_response_chunks(resp)
-        
-        print("\n\033[1;33m--- End of Response ---\033[0m")
-        
+    `body` is what the client sent (logged as-is); when a translator is given,
+    the chat completion stream is converted by it before reaching the client.
+    """
+    started_at = time.time()
+    started = time.monotonic()
+    client = httpx.AsyncClient()
+    try:
+        with root.activate():
+            with tracer.span("gui.reset"):
+                await client.get("http://127.0.0.1:9000/reset")
+            with tracer.span("gui.start"):
+                await client.get("http://127.0.0.1:9000/start")
+
+            log_file = utils.log_request(request, body)
+            utils.print_request_messages(chat_body)
+
+            model = usage.request_model(chat_body)
+            root.set("gen_ai.request.model", model)
+            upstream_body, streaming, strip_usage = usage.request_usage(chat_body)
+            headers = {k: v for k, v in request.headers.items() if k.lower() != "content-length"}
+
+            stream = await upstream.open_stream(
+                client,
+                "POST" if translator else request.method,
+                f"{TARGET_URL}/v1/chat/completions",
+                content=upstream_body,
+                headers=headers,
+                streaming=streaming,
+            )
+    except UpstreamError as e:
+        print(f"Error: {e}")
+        await client.get("http://127.0.0.1:9000/stop")
+        await client.aclose()
+        try:
+            await asyncio.to_thread(request_store.record, chat_body, started_at, usage.client_id(request),
+                                    status=504, duration=time.monotonic() - started, source=log_file)
+        except Exception as record_error:
+            print(f"Error recording request: {record_error}")
+        root.set("error", str(e))
+        root.end()
+        error_response = {
+            "error": {
+                "message": str(e),
+                "type": "upstream_error",
+                "code": "upstream_unavailable"
+            }
+        }
         return Response(
-            content=resp.content,
-            status_code=resp.status_code,
-            headers=dict(resp.headers)
+            content=json.dumps(error_response),
+            status_code=504,
+            headers={"Content-Type": "application/json"}
         )
+    except BaseException:
+        await client.aclose()
+        root.end()
+        raise
+
+    print(f"\n\033[1;33m--- Response: {stream.status_code} ---\033[0m")
+    root.set("http.status_code", stream.status_code)
+
+    # Upstream errors are passed through untranslated
+    if stream.status_code >= 400:
+        translator = None
+
+    printer = utils.ResponsePrinter()
+    tracker = usage.UsageTracker(streaming, strip_usage)
+    first_token_time = stream.first_chunk_at
+    stream_span = tracer.span("upstream.stream", parent=root)
+    print_seconds = 0.0
+    chunks = 0
+
+    async def relay():
+        nonlocal print_seconds, chunks
+        try:
+            async for chunk in stream:
+                chunks += 1
+                print_started = time.perf_counter()
+                printer.feed(chunk)
+                print_seconds += time.perf_counter() - print_started
+                chunk = tracker.feed(chunk)
+                if translator:
+                    chunk = translator.feed(chunk)
+                if chunk:
+                    yield chunk
+            chunk = tracker.close()
+            if translator:
+                chunk = translator.feed(chunk) + translator.close()
+            if chunk:
+                yield chunk
+        except TimeoutError:
+            # Bytes already reached the client, so the request cannot be
+            # retried; abort the connection so the client sees the failure.
+            upstream.stats.idle_timeouts += 1
+            stream_span.set("error", "idle timeout")
+            print("\nError: upstream idle timeout, aborting response")
+            raise
+
+    async def finish():
+        printer.close()
+        stream_span.set("chunks", chunks)
+        stream_span.set("console_print_seconds", print_seconds)
+        stream_span.end()
+        finished = time.monotonic()
+        if stream.status_code < 400:
+            # A non-streamed body arrives as one chunk, so its generation
+            # time can only be measured from the start of the request
+            generation_started = first_token_time if streaming else started
+            usage_ledger.record(model, usage.client_id(request), tracker.usage,
+                                finished - generation_started)
+        await stream.aclose()
+        try:
+            with tracer.span("gui.stop", parent=root):
+                await client.get("http://127.0.0.1:9000/stop")
+        finally:
+            await client.aclose()
+        try:
+            with tracer.span("request_store.record", parent=root):
+                await asyncio.to_thread(request_store.record, chat_body, started_at, usage.client_id(request),
+                                        status=stream.status_code, ttft=first_token_time - started,
+                                        duration=finished - started, source=log_file)
+        except Exception as e:
+            print(f"Error recording request: {e}")
+        root.end()
+        print("\n\033[1;33m--- End of Response ---\033[0m")
+        print(f"Upstream stats: {upstream.stats.snapshot()}")
+
+    headers = stream.headers
+    if translator:
+        headers = {k: v for k, v in headers.items() if k.lower() != "content-type"}
+    return RelayResponse(
+        relay(),
+        on_close=finish,
+        status_code=stream.status_code,
+        headers=headers,
+        media_type=translator.media_type if translator else None
+    )
+
+@app.get("/proxy/stats")
+async def proxy_stats():
+    return {"upstream": upstream.stats.snapshot()}
+
+@app.get("/proxy/usage")
+async def proxy_usage(model: str | None = None, client: str | None = None):
+    return usage_ledger.totals(model=model, client=client)
 
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def unimplemented_paths(request: Request, path: str):
@@ -6,11 +6,14 @@ from typing import Optional, List, Dict
 from kubernetes import config, client
 from openshift.dynamic import DynamicClient
 
+from proxy.tracing import tracer
+
 
 def create_dynamic_client() -> DynamicClient:
     k8s_client = config.new_client_from_config()
     return DynamicClient(k8s_client)
 
+@tracer.traced("metrics.get_epp_pod")
 def get_epp_pod(dyn_client: DynamicClient, namespace: str, label_selector: str = 'inferencepool=gaie-kv-events-epp'):
     v1_pods = dyn_client.resources.get(api_version='v1', kind='Pod')
     pods = v1_pods.get(namespace=namespace, label_selector=label_selector)
@@ -18,6 +21,7 @@ def get_epp_pod(dyn_client: DynamicClient, namespace: str, label_selector: str =
     assert len(pods.items) == 1, "Expected exactly one epp"
     return pods.items[0]
 
+@tracer.traced("metrics.get_pod_logs")
 def get_pod_logs(k8s_client: client.ApiClient, pod_name: str, namespace: str, tail_lines: int = 100) -> List[str]:
     core_v1 = client.CoreV1Api(api_client=k8s_client)
     pod_logs: str = core_v1.read_namespaced_pod_log(name=pod_name, namespace=namespace, tail_lines=tail_lines)
@@ -0,0 +1,211 @@
+import argparse
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import yaml
+
+REQUEST_STORE_PATH = pathlib.Path("logs/requests.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    model TEXT NOT NULL,
+    client TEXT,
+    message_count INTEGER,
+    prompt_bytes INTEGER,
+    status INTEGER,
+    ttft REAL,
+    duration REAL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS requests_timestamp ON requests (timestamp);
+CREATE INDEX IF NOT EXISTS requests_model_timestamp ON requests (model, timestamp);
+-- YAML log file name, so a log is never indexed twice (live and by import)
+CREATE UNIQUE INDEX IF NOT EXISTS requests_source ON requests (source);
+CREATE TABLE IF NOT EXISTS bodies (
+    request_id INTEGER PRIMARY KEY REFERENCES requests (id),
+    body BLOB NOT NULL
+);
+"""
+
+# Bucket widths for --group-by, in seconds
+BUCKETS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def request_summary(body: bytes) -> Dict:
+    """Extract the indexed fields from a chat completion request body."""
+    try:
+        body_json = json.loads(body)
+    except ValueError:
+        body_json = {}
+    if not isinstance(body_json, dict):
+        body_json = {}
+    return {
+        "model": body_json.get("model") or "unknown",
+        "message_count": len(body_json.get("messages") or []),
+        "prompt_bytes": len(body),
+    }
+
+
+class RequestStore:
+    """SQLite index of captured requests.
+
+    Scalar fields live in `requests` for fast aggregates; compressed bodies
+    live in `bodies` and are only read by `body()`.
+    """
+
+    def __init__(self, path: pathlib.Path = REQUEST_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def record(self, body: bytes, timestamp: float, client: Optional[str] = None,
+               status: Optional[int] = None, ttft: Optional[float] = None,
+               duration: Optional[float] = None, source: Optional[str] = None) -> Optional[int]:
+        """Index a request; returns None if the `source` log was already indexed."""
+        summary = request_summary(body)
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO requests"
+                " (timestamp, model, client, message_count, prompt_bytes, status, ttft, duration, source)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (timestamp, summary["model"], client, summary["message_count"],
+                 summary["prompt_bytes"], status, ttft, duration, source),
+            )
+            if cursor.rowcount == 0:
+                return None
+            request_id = cursor.lastrowid
+            self.conn.execute("INSERT INTO bodies (request_id, body) VALUES (?, ?)",
+                              (request_id, zlib.compress(body)))
+        return request_id
+
+    def body(self, request_id: int) -> Optional[bytes]:
+        with self._lock:
+            row = self.conn.execute("SELECT body FROM bodies WHERE request_id = ?", (request_id,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def aggregate(self, since: Optional[float] = None, model: Optional[str] = None,
+                  group_by: Optional[str] = None) -> List[Dict]:
+        """Per model (and optional time bucket) counts and averages."""
+        where, params = [], []
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if model is not None:
+            where.append("model = ?")
+            params.append(model)
+
+        bucket = f"CAST(timestamp / {BUCKETS[group_by]} AS INTEGER) * {BUCKETS[group_by]}" if group_by else "NULL"
+        query = f"""
+            SELECT model, {bucket} AS bucket, COUNT(*), AVG(message_count), AVG(prompt_bytes),
+                   MAX(prompt_bytes), AVG(ttft), MAX(ttft), AVG(duration), MAX(duration),
+                   SUM(status >= 400)
+            FROM requests
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY model, bucket
+            ORDER BY model, bucket
+        """
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        keys = ["model", "bucket", "requests", "avg_messages", "avg_prompt_bytes", "max_prompt_bytes",
+                "avg_ttft", "max_ttft", "avg_duration", "max_duration", "errors"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def import_yaml_logs(self, log_dir: pathlib.Path) -> int:
+        """Backfill from the per-request YAML logs (status and timings are unknown).
+
+        Files that were already indexed, live or by an earlier import, are
+        skipped; returns the number of new rows.
+        """
+        count = 0
+        for log_file in sorted(log_dir.glob("request_*.yaml")):
+            # Drop the numbered suffix of logs written within the same second
+            stamp = "_".join(log_file.stem.split("_")[:3])
+            timestamp = time.mktime(time.strptime(stamp, "request_%Y%m%d_%H%M%S"))
+            request_log = yaml.safe_load(log_file.read_text())
+            if self.record(request_log["body"].encode("utf-8"), timestamp, source=log_file.name) is not None:
+                count += 1
+        return count
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _parse_since(value: str) -> float:
+    """'90m', '24h', '7d' -> unix timestamp that far in the past."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    try:
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"invalid window {value!r}, expected e.g. 90m, 24h, 7d")
+
+
+def _format(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}" if value < 100 else f"{value:.0f}"
+    return str(value)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query the captured request index")
+    parser.add_argument("--db", type=pathlib.Path, default=REQUEST_STORE_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary = subparsers.add_parser("summary", help="aggregate prompt size and latency")
+    summary.add_argument("--since", type=_parse_since, help="look back window, e.g. 90m, 24h, 7d")
+    summary.add_argument("--model")
+    summary.add_argument("--group-by", choices=sorted(BUCKETS))
+
+    body = subparsers.add_parser("body", help="print a stored request body")
+    body.add_argument("request_id", type=int)
+
+    backfill = subparsers.add_parser("import", help="backfill from YAML request logs")
+    backfill.add_argument("log_dir", type=pathlib.Path, nargs="?", default=pathlib.Path("logs/requests"))
+
+    args = parser.parse_args(argv)
+    store = RequestStore(args.db)
+
+    if args.command == "summary":
+        started = time.perf_counter()
+        rows = store.aggregate(
+            since=args.since,
+            model=args.model,
+            group_by=args.group_by,
+        )
+        for row in rows:
+            if row["bucket"] is not None:
+                row["bucket"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["bucket"]))
+            print("  ".join(f"{key}={_format(value)}" for key, value in row.items()
+                            if key != "bucket" or value is not None))
+        print(f"{len(rows)} rows in {(time.perf_counter() - started) * 1000:.1f} ms")
+    elif args.command == "body":
+        content = store.body(args.request_id)
+        print(content.decode("utf-8") if content is not None else f"No body for request {args.request_id}")
+    elif args.command == "import":
+        print(f"Imported {store.import_yaml_logs(args.log_dir)} request logs")
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+RESPONSES_STORE_SIZE = int(os.environ.get("RESPONSES_STORE_SIZE", 256))
+
+# Sampling parameters that mean the same thing in both APIs
+PASSTHROUGH_PARAMS = ["temperature", "top_p", "parallel_tool_calls", "user", "seed"]
+
+
+class ResponsesRequestError(Exception):
+    """A Responses API request that cannot be translated (returned as a 400)."""
+
+    def __init__(self, message: str, code: str = "invalid_request"):
+        super().__init__(message)
+        self.code = code
+
+
+class ConversationStore:
+    """Bounded LRU of chat histories keyed by response id.
+
+    Each entry is the full message list up to and including that response's
+    output (without `instructions`, which do not carry over between turns).
+    Lists share message dicts, so a long conversation costs one pointer per
+    message per turn.
+    """
+
+    def __init__(self, max_entries: int = RESPONSES_STORE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, response_id: str) -> Optional[List[Dict]]:
+        messages = self._entries.get(response_id)
+        if messages is None:
+            return None
+        self._entries.move_to_end(response_id)
+        return list(messages)
+
+    def put(self, response_id: str, messages: List[Dict]) -> None:
+        self._entries[response_id] = messages
+        self._entries.move_to_end(response_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+MESSAGE_ROLES = {"user", "assistant", "system", "developer"}
+
+
+def _require(obj: Dict, key: str, where: str, kind: type = str):
+    """Return `obj[key]`, raising ResponsesRequestError if it is missing or mistyped."""
+    value = obj.get(key)
+    if not isinstance(value, kind):
+        raise ResponsesRequestError(f"Missing or invalid parameter: '{where}.{key}'")
+    return value
+
+
+def _require_object(value, where: str) -> Dict:
+    if not isinstance(value, dict):
+        raise ResponsesRequestError(f"Invalid parameter: '{where}' must be an object")
+    return value
+
+
+def _content_to_chat(content, where: str):
+    """Responses message content (string or typed parts) -> chat content."""
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list):
+        raise ResponsesRequestError(f"Invalid parameter: '{where}' must be a string or a list")
+    parts = []
+    for index, part in enumerate(content):
+        part_where = f"{where}[{index}]"
+        part_type = _require_object(part, part_where).get("type")
+        if part_type in ("input_text", "output_text", "text"):
+            parts.append({"type": "text", "text": _require(part, "text", part_where)})
+        elif part_type == "input_image":
+            parts.append({"type": "image_url", "image_url": {"url": _require(part, "image_url", part_where)}})
+        elif part_type == "refusal":
+            parts.append({"type": "text", "text": _require(part, "refusal", part_where)})
+        else:
+            raise ResponsesRequestError(f"Unsupported content part type '{part_type}'")
+    if all(part["type"] == "text" for part in parts):
+        return "".join(part["text"] for part in parts)
+    return parts
+
+
+def input_to_messages(input_items) -> List[Dict]:
+    """Translate Responses `input` into chat completion messages."""
+    if isinstance(input_items, str):
+        return [{"role": "user", "content": input_items}]
+    if input_items is None:
+        return []
+    if not isinstance(input_items, list):
+        raise ResponsesRequestError("Invalid parameter: 'input' must be a string or a list")
+
+    messages: List[Dict] = []
+    for index, item in enumerate(input_items):
+        where = f"input[{index}]"
+        item_type = _require_object(item, where).get("type", "message")
+        if item_type == "message":
+            role = item.get("role", "user")
+            if role not in MESSAGE_ROLES:
+                raise ResponsesRequestError(f"Invalid value for '{where}.role': {role!r}")
+            role = "system" if role == "developer" else role
+            messages.append({"role": role, "content": _content_to_chat(item.get("content"), f"{where}.content")})
+        elif item_type == "function_call":
+            arguments = item.get("arguments", "")
+            if not isinstance(arguments, str):
+                raise ResponsesRequestError(f"Invalid parameter: '{where}.arguments' must be a string")
+            tool_call = {
+                "id": _require(item, "call_id", where),
+                "type": "function",
+                "function": {"name": _require(item, "name", where), "arguments": arguments},
+            }
+            # Consecutive calls from one turn belong to a single assistant message
+            previous = messages[-1] if messages else None
+            if previous and previous["role"] == "assistant" and previous.get("tool_calls"):
+                previous["tool_calls"].append(tool_call)
+            else:
+                messages.append({"role": "assistant", "content": None, "tool_calls": [tool_call]})
+        elif item_type == "function_call_output":
+            output = item.get("output")
+            messages.append({
+                "role": "tool",
+                "tool_call_id": _require(item, "call_id", where),
+                "content": output if isinstance(output, str) else json.dumps(output),
+            })
+        elif item_type == "reasoning":
+            continue  # reasoning is not replayed to chat models
+        else:
+            raise ResponsesRequestError(f"Unsupported input item type '{item_type}'")
+    return messages
+
+
+def _tools_to_chat(tools: List[Dict]) -> List[Dict]:
+    if not isinstance(tools, list):
+        raise ResponsesRequestError("Invalid parameter: 'tools' must be a list")
+    chat_tools = []
+    for index, tool in enumerate(tools):
+        where = f"tools[{index}]"
+        if _require_object(tool, where).get("type") != "function":
+            raise ResponsesRequestError(f"Unsupported tool type '{tool.get('type')}'")
+        function = {"name": _require(tool, "name", where), "parameters": tool.get("parameters") or {}}
+        if tool.get("description"):
+            function["description"] = tool["description"]
+        if tool.get("strict") is not None:
+            function["strict"] = tool["strict"]
+        chat_tools.append({"type": "function", "function": function})
+    return chat_tools
+
+
+def _tool_choice_to_chat(tool_choice):
+    if isinstance(tool_choice, dict) and tool_choice.get("type") == "function":
+        return {"type": "function", "function": {"name": _require(tool_choice, "name", "tool_choice")}}
+    return tool_choice
+
+
+def _text_format_to_chat(text: Dict) -> Optional[Dict]:
+    text_format = _require_object(_require_object(text or {}, "text").get("format") or {}, "text.format")
+    if text_format.get("type") == "json_schema":
+        json_schema = {k: text_format[k] for k in ("name", "schema", "strict", "description") if k in text_format}
+        return {"type": "json_schema", "json_schema": json_schema}
+    if text_format.get("type") == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def translate_request(body: bytes, store: ConversationStore) -> Tuple[bytes, "ResponsesTranslator"]:
+    """Build a streaming chat completion body and the translator for its output."""
+    try:
+        request = json.loads(body)
+    except ValueError as e:
+        raise ResponsesRequestError(f"Invalid JSON body: {e}")
+    if not isinstance(request, dict) or not isinstance(request.get("model"), str):
+        raise ResponsesRequestError("Missing required parameter: 'model'")
+    if not isinstance(request.get("instructions") or "", str):
+        raise ResponsesRequestError("Invalid parameter: 'instructions' must be a string")
+
+    history: List[Dict] = []
+    previous_response_id = request.get("previous_response_id")
+    if previous_response_id:
+        if not isinstance(previous_response_id, str):
+            raise ResponsesRequestError("Invalid parameter: 'previous_response_id' must be a string")
+        history = store.get(previous_response_id)
+        if history is None:
+            raise ResponsesRequestError(
+                f"Previous response with id '{previous_response_id}' not found.",
+                code="previous_response_not_found",
+            )
+    history.extend(input_to_messages(request.get("input")))
+
+    messages = list(history)
+    if request.get("instructions"):
+        messages.insert(0, {"role": "system", "content": request["instructions"]})
+
+    chat_request = {
+        "model": request["model"],
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    for param in PASSTHROUGH_PARAMS:
+        if request.get(param) is not None:
+            chat_request[param] = request[param]
+    if request.get("max_output_tokens") is not None:
+        chat_request["max_tokens"] = request["max_output_tokens"]
+    if request.get("tools"):
+        chat_request["tools"] = _tools_to_chat(request["tools"])
+    if request.get("tool_choice") is not None:
+        chat_request["tool_choice"] = _tool_choice_to_chat(request["tool_choice"])
+    response_format = _text_format_to_chat(request.get("text"))
+    if response_format:
+        chat_request["response_format"] = response_format
+
+    translator = ResponsesTranslator(request, history, store)
+    return json.dumps(chat_request).encode("utf-8"), translator
+
+
+class ResponsesTranslator:
+    """Converts a chat completion SSE stream into Responses API output.
+
+    Streaming requests get Responses SSE events as soon as each chat chunk
+    arrives; non-streaming requests get the final response object on close.
+    The finished conversation is saved to the store under the new response id.
+    """
+
+    def __init__(self, request: Dict, history: List[Dict], store: ConversationStore):
+        self.request = request
+        self.history = history
+        self.store = store
+        self.streaming = bool(request.get("stream"))
+        self.media_type = "text/event-stream" if self.streaming else "application/json"
+
+        self.response_id = f"resp_{uuid.uuid4().hex}"
+        self.created_at = int(time.time())
+        self.output: List[Dict] = []
+        self.usage: Optional[Dict] = None
+        self.finish_reason: Optional[str] = None
+        self.error: Optional[Dict] = None
+        self.completed = False
+        self.done = False
+
+        self._buffer = b""
+        self._sequence = 0
+        self._started = False
+        self._message: Optional[Dict] = None
+        self._message_index = 0
+        self._tool_calls: Dict[int, Dict] = {}
+        self._tool_call_indexes: Dict[int, int] = {}
+
+    # -- chat stream input ------------------------------------------------
+
+    def feed(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        *events, self._buffer = self._buffer.split(b"\n\n")
+        out: List[str] = []
+        if not self._started:
+            self._started = True
+            self._emit(out, "response.created", response=self._response("in_progress"))
+            self._emit(out, "response.in_progress", response=self._response("in_progress"))
+        for event in events:
+            self._chat_event(event, out)
+        return self._encode(out)
+
+    def close(self) -> bytes:
+        out: List[str] = []
+        if self._buffer.strip():
+            self._chat_event(self._buffer, out)
+            self._buffer = b""
+        if not self.done and self.finish_reason is None and not self.error:
+            # Upstream went away mid-generation; do not pass the partial
+            # answer off as complete or replay it on the next turn
+            self.error = {"code": "server_error", "message": "Upstream stream ended before the response finished"}
+        if not self.completed:
+            self._complete(out)
+        if self.streaming:
+            return self._encode(out)
+        return json.dumps(self._response(self._final_status())).encode("utf-8")
+
+    def _chat_event(self, event: bytes, out: List[str]) -> None:
+        data = [line[len(b"data:"):].strip() for line in event.split(b"\n") if line.startswith(b"data:")]
+        if not data:
+            return
+        payload = b"\n".join(data)
+        if payload == b"[DONE]":
+            self.done = True
+            self._complete(out)
+            return
+
+        chunk = json.loads(payload)
+        if chunk.get("error"):
+            error = chunk["error"]
+            self.error = {"code": "server_error", "message": error.get("message", str(error))
+                          if isinstance(error, dict) else str(error)}
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                self._text_delta(delta["content"], out)
+            for tool_call in delta.get("tool_calls") or []:
+                self._tool_call_delta(tool_call, out)
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+    # -- output items -----------------------------------------------------
+
+    def _text_delta(self, text: str, out: List[str]) -> None:
+        if self._message is None:
+            self._message = {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "in_progress",
+                "role": "assistant",
+                "content": [],
+            }
+            self._message_index = len(self.output)
+            self.output.append(self._message)
+            self._emit(out, "response.output_item.added",
+                       output_index=self._message_index, item=self._message)
+            self._message["content"].append({"type": "output_text", "text": "", "annotations": []})
+            self._emit(out, "response.content_part.added", item_id=self._message["id"],
+                       output_index=self._message_index, content_index=0,
+                       part={"type": "output_text", "text": "", "annotations": []})
+        self._message["content"][0]["text"] += text
+        self._emit(out, "response.output_text.delta", item_id=self._message["id"],
+                   output_index=self._message_index, content_index=0, delta=text)
+
+    def _tool_call_delta(self, tool_call: Dict, out: List[str]) -> None:
+        index = tool_call.get("index", 0)
+        function = tool_call.get("function") or {}
+        item = self._tool_calls.get(index)
+        if item is None:
+            item = {
+                "type": "function_call",
+                "id": f"fc_{uuid.uuid4().hex}",
+                "call_id": tool_call.get("id") or f"call_{uuid.uuid4().hex}",
+                "name": function.get("name", ""),
+                "arguments": "",
+                "status": "in_progress",
+            }
+            self._tool_calls[index] = item
+            self._tool_call_indexes[index] = len(self.output)
+            self.output.append(item)
+            self._emit(out, "response.output_item.added", output_index=self._tool_call_indexes[index], item=item)
+        elif function.get("name"):
+            item["name"] += function["name"]
+        if function.get("arguments"):
+            item["arguments"] += function["arguments"]
+            self._emit(out, "response.function_call_arguments.delta", item_id=item["id"],
+                       output_index=self._tool_call_indexes[index], delta=function["arguments"])
+
+    def _complete(self, out: List[str]) -> None:
+        if self.completed:
+            return
+        self.completed = True
+        status = self._final_status()
+        for output_index, item in enumerate(self.output):
+            item["status"] = "completed" if status == "completed" else "incomplete"
+            if item["type"] == "message":
+                part = item["content"][0]
+                self._emit(out, "response.output_text.done", item_id=item["id"],
+                           output_index=output_index, content_index=0, text=part["text"])
+                self._emit(out, "response.content_part.done", item_id=item["id"],
+                           output_index=output_index, content_index=0, part=part)
+            else:
+                self._emit(out, "response.function_call_arguments.done", item_id=item["id"],
+                           output_index=output_index, arguments=item["arguments"])
+            self._emit(out, "response.output_item.done", output_index=output_index, item=item)
+
+        self._emit(out, f"response.{status}", response=self._response(status))
+        if status != "failed":
+            self._save()
+
+    def _save(self) -> None:
+        if self.request.get("store") is False:
+            return
+        # Chat backends reject an assistant message with neither content nor tool calls
+        assistant = {"role": "assistant", "content": None if self._tool_calls else ""}
+        if self._message is not None:
+            assistant["content"] = self._message["content"][0]["text"]
+        if self._tool_calls:
+            assistant["tool_calls"] = [
+                {"id": item["call_id"], "type": "function",
+                 "function": {"name": item["name"], "arguments": item["arguments"]}}
+                for _, item in sorted(self._tool_calls.items())
+            ]
+        self.store.put(self.response_id, self.history + [assistant])
+
+    # -- serialisation ----------------------------------------------------
+
+    def _final_status(self) -> str:
+        if self.error:
+            return "failed"
+        return "incomplete" if self.finish_reason == "length" else "completed"
+
+    def _response(self, status: str) -> Dict:
+        response = {
+            "id": self.response_id,
+            "object": "response",
+            "created_at": self.created_at,
+            "status": status,
+            "model": self.request.get("model"),
+            "output": self.output if status != "in_progress" else [],
+            "previous_response_id": self.request.get("previous_response_id"),
+            "instructions": self.request.get("instructions"),
+            "tools": self.request.get("tools") or [],
+            "tool_choice": self.request.get("tool_choice", "auto"),
+            "parallel_tool_calls": self.request.get("parallel_tool_calls", True),
+            "temperature": self.request.get("temperature"),
+            "top_p": self.request.get("top_p"),
+            "max_output_tokens": self.request.get("max_output_tokens"),
+            "store": self.request.get("store", True),
+            "metadata": self.request.get("metadata") or {},
+            "text": self.request.get("text") or {"format": {"type": "text"}},
+            "error": self.error,
+            "incomplete_details": {"reason": "max_output_tokens"} if status == "incomplete" else None,
+            "usage": None,
+        }
+        if self.usage and status != "in_progress":
+            response["usage"] = {
+                "input_tokens": self.usage.get("prompt_tokens", 0),
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": self.usage.get("completion_tokens", 0),
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": self.usage.get("total_tokens", 0),
+            }
+        return response
+
+    def _emit(self, out: List[str], event_type: str, **fields) -> None:
+        if not self.streaming:
+            return
+        event = {"type": event_type, "sequence_number": self._sequence, **fields}
+        self._sequence += 1
+        out.append(f"event: {event_type}\ndata: {json.dumps(event)}\n\n")
+
+    @staticmethod
+    def _encode(out: List[str]) -> bytes:
+        return "".join(out).encode("utf-8")
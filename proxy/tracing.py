@@ -0,0 +1,256 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import pathlib
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+TRACE_EXPORT_PATH = pathlib.Path("logs/traces.jsonl")
+SERVICE_NAME = "llmd-proxy"
+
+# Queued by SpanExporter.shutdown() to stop the exporter thread
+_STOP = object()
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """A timed phase of a request, serialised as an OTLP/JSON span."""
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str,
+                 parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._token: Optional[contextvars.Token] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.exporter.export(self)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this the current span without ending it on exit."""
+        token = _current_span.set(self)
+        try:
+            yield self
+        finally:
+            _current_span.reset(token)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.end()
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stand-in returned when a request is not sampled; every method is free."""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def activate(self) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """Batches finished spans on a background thread.
+
+    Each batch is written as one OTLP/JSON ExportTraceServiceRequest line to
+    `path`, or POSTed to an OTLP/HTTP collector when `url` is set.
+    """
+
+    def __init__(self, path: pathlib.Path = TRACE_EXPORT_PATH, url: Optional[str] = None,
+                 batch_size: int = 64, interval: float = 1.0):
+        self.path = path
+        self.url = url
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        self._queue.put(span)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            span = self._queue.get()
+            if span is _STOP:
+                return
+            batch = [span]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    span = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if span is _STOP:
+                    stopping = True
+                    break
+                batch.append(span)
+            self._write(batch)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Write every queued span and stop the exporter thread (used on shutdown)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _write(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "proxy.tracing"},
+                    "spans": [span.to_otlp() for span in batch],
+                }],
+            }]
+        }
+        try:
+            if self.url:
+                httpx.post(self.url, json=payload, timeout=5.0)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a") as f:
+                    f.write(json.dumps(payload) + "\n")
+        except Exception as e:
+            print(f"Error exporting {len(batch)} spans: {e}")
+
+
+class Tracer:
+    """Creates spans for sampled traces; unsampled traces cost a context lookup."""
+
+    def __init__(self, sample_rate: float = 0.0, exporter: Optional[SpanExporter] = None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter or SpanExporter()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(
+            sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", 0.0)),
+            exporter=SpanExporter(
+                path=pathlib.Path(os.environ.get("TRACE_EXPORT_PATH", TRACE_EXPORT_PATH)),
+                url=os.environ.get("TRACE_EXPORT_URL") or None,
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """Start a root span, honouring an incoming W3C `traceparent` header.
+
+        Returns NOOP_SPAN when the trace is not sampled.
+        """
+        trace_id = parent_id = None
+        sampled = self.enabled and random.random() < self.sample_rate
+        if traceparent:
+            parts = traceparent.split("-")
+            if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                trace_id, parent_id = parts[1], parts[2]
+                sampled = self.enabled and (sampled or parts[3] == "01")
+        if not sampled:
+            return NOOP_SPAN
+        return Span(self, name, trace_id or f"{random.getrandbits(128):032x}", parent_id, attributes)
+
+    def span(self, name: str, parent: Optional[Span] = None, **attributes):
+        """Start a child of `parent` (default: the current span), or a no-op if untraced."""
+        parent = parent or _current_span.get()
+        if not isinstance(parent, Span):
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator wrapping a sync function call in a child span."""
+        def decorator(func):
+            span_name = name or f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from proxy.tracing import tracer
+
+# Statuses that mean "this gateway pod could not take the request" rather
+# than "the request is bad", so another attempt may succeed.
+RETRY_STATUSES = {502, 503, 504}
+RETRY_ERRORS = (httpx.TransportError, TimeoutError)
+
+# Hop-by-hop / body framing headers that must not be copied onto a
+# re-streamed response.
+DROPPED_RESPONSE_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection"}
+
+
+class UpstreamError(Exception):
+    """Raised when every attempt failed before the first byte was received."""
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
+@dataclass
+class UpstreamConfig:
+    """Per-phase deadlines (seconds), retry and hedging settings."""
+    connect_timeout: float = 5.0
+    first_token_timeout: float = 120.0
+    idle_timeout: float = 60.0
+    max_retries: int = 2
+    retry_backoff: float = 0.25
+    hedge_percentile: Optional[float] = None  # e.g. 95; None disables hedging
+    hedge_min_samples: int = 20
+    hedge_url: Optional[str] = None  # defaults to the primary upstream
+
+    @classmethod
+    def from_env(cls) -> "UpstreamConfig":
+        return cls(
+            connect_timeout=_env_float("UPSTREAM_CONNECT_TIMEOUT", cls.connect_timeout),
+            first_token_timeout=_env_float("UPSTREAM_FIRST_TOKEN_TIMEOUT", cls.first_token_timeout),
+            idle_timeout=_env_float("UPSTREAM_IDLE_TIMEOUT", cls.idle_timeout),
+            max_retries=int(os.environ.get("UPSTREAM_MAX_RETRIES", cls.max_retries)),
+            retry_backoff=_env_float("UPSTREAM_RETRY_BACKOFF", cls.retry_backoff),
+            hedge_percentile=_env_float("UPSTREAM_HEDGE_PERCENTILE", None),
+            hedge_min_samples=int(os.environ.get("UPSTREAM_HEDGE_MIN_SAMPLES", cls.hedge_min_samples)),
+            hedge_url=os.environ.get("UPSTREAM_HEDGE_URL") or None,
+        )
+
+
+class UpstreamStats:
+    """Counters for retries and hedges plus a rolling window of TTFT samples."""
+
+    def __init__(self, window: int = 500):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self.idle_timeouts = 0
+        self.ttft_samples: deque = deque(maxlen=window)
+
+    def record_ttft(self, seconds: float) -> None:
+        self.ttft_samples.append(seconds)
+
+    def ttft_percentile(self, percentile: float) -> Optional[float]:
+        if not self.ttft_samples:
+            return None
+        ordered = sorted(self.ttft_samples)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict:
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "idle_timeouts": self.idle_timeouts,
+            "retry_rate": self.retries / requests,
+            "hedge_rate": self.hedges / requests,
+            "ttft_p50": self.ttft_percentile(50),
+            "ttft_p95": self.ttft_percentile(95),
+        }
+
+
+class UpstreamStream:
+    """An upstream response whose first chunk has already arrived."""
+
+    def __init__(self, response: httpx.Response, first_chunk: bytes,
+                 iterator: AsyncIterator[bytes], idle_timeout: Optional[float]):
+        self.response = response
+        self.first_chunk = first_chunk
+        self._iterator = iterator
+        self._idle_timeout = idle_timeout
+        self.first_chunk_at = time.monotonic()
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {k: v for k, v in self.response.headers.items()
+                if k.lower() not in DROPPED_RESPONSE_HEADERS}
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        if self.first_chunk:
+            yield self.first_chunk
+        while True:
+            try:
+                chunk = await asyncio.wait_for(anext(self._iterator), self._idle_timeout)
+            except StopAsyncIteration:
+                return
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.response.aclose()
+
+
+class Upstream:
+    """Opens upstream streams with deadlines, safe retries and optional hedging.
+
+    Retries and hedges only happen before the first chunk is handed back to
+    the caller, i.e. before anything has been sent to the client. The first
+    chunk of a non-streamed request is the whole completion, so those get no
+    first-token deadline, are not hedged and do not feed the TTFT samples.
+    """
+
+    def __init__(self, config: UpstreamConfig):
+        self.config = config
+        self.stats = UpstreamStats()
+
+    async def open_stream(self, client: httpx.AsyncClient, method: str, url: str,
+                          content: bytes, headers: Dict[str, str],
+                          streaming: bool = True) -> UpstreamStream:
+        self.stats.requests += 1
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self.config.max_retries + 1):
+            if attempt:
+                self.stats.retries += 1
+                await asyncio.sleep(self.config.retry_backoff * 2 ** (attempt - 1))
+            try:
+                stream = await self._hedged_attempt(client, method, url, content, headers,
+                                                    self.config.hedge_url or url, attempt, streaming)
+            except RETRY_ERRORS as e:
+                print(f"Upstream attempt {attempt + 1} failed: {type(e).__name__}: {e}")
+                last_error = e
+                continue
+
+            if stream.status_code in RETRY_STATUSES and attempt < self.config.max_retries:
+                print(f"Upstream attempt {attempt + 1} returned {stream.status_code}, retrying")
+                await stream.aclose()
+                continue
+            return stream
+
+        self.stats.failures += 1
+        raise UpstreamError(f"upstream failed after {self.config.max_retries + 1} attempts: {last_error!r}")
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.config.hedge_percentile is None:
+            return None
+        if len(self.stats.ttft_samples) < self.config.hedge_min_samples:
+            return None
+        return self.stats.ttft_percentile(self.config.hedge_percentile)
+
+    async def _hedged_attempt(self, client, method, url, content, headers, hedge_url,
+                              attempt: int, streaming: bool) -> UpstreamStream:
+        primary = asyncio.create_task(self._attempt(client, method, url, content, headers, attempt, streaming))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            delay = self.hedge_delay() if streaming else None
+            if delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if done:
+                    return primary.result()
+                self.stats.hedges += 1
+                pending.add(asyncio.create_task(
+                    self._attempt(client, method, hedge_url, content, headers, attempt, streaming,
+                                  hedge=True)))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                error = next((task.exception() for task in done if task.exception()), error)
+                if winners:
+                    for loser in winners[1:]:
+                        await loser.result().aclose()
+                    if winners[0] is not primary:
+                        self.stats.hedge_wins += 1
+                    return winners[0].result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                result = (await asyncio.gather(task, return_exceptions=True))[0]
+                if isinstance(result, UpstreamStream):
+                    await result.aclose()
+
+    async def _attempt(self, client, method, url, content, headers, attempt: int,
+                       streaming: bool, hedge: bool = False) -> UpstreamStream:
+        self.stats.attempts += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        request = client.build_request(
+            method, url, content=content, headers=headers,
+            timeout=httpx.Timeout(None, connect=self.config.connect_timeout),
+        )
+
+        async def first_chunk() -> UpstreamStream:
+            with tracer.span("upstream.attempt", url=url, attempt=attempt, hedge=hedge) as span:
+                with tracer.span("upstream.connect"):
+                    response = await client.send(request, stream=True)
+                span.set("http.status_code", response.status_code)
+                try:
+                    iterator = response.aiter_bytes()
+                    with tracer.span("upstream.first_token"):
+                        try:
+                            chunk = await anext(iterator)
+                        except StopAsyncIteration:
+                            chunk = b""
+                except BaseException:
+                    await response.aclose()
+                    raise
+                return UpstreamStream(response, chunk, iterator, self.config.idle_timeout)
+
+        stream = await asyncio.wait_for(first_chunk(), self.config.first_token_timeout if streaming else None)
+        if streaming and stream.status_code < 400:
+            self.stats.record_ttft(loop.time() - started)
+        return stream
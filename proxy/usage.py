@@ -0,0 +1,179 @@
+import json
+import os
+import pathlib
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+
+USAGE_LEDGER_PATH = pathlib.Path("logs/usage.json")
+
+
+def request_usage(body: bytes) -> Tuple[bytes, bool, bool]:
+    """Ask upstream for token usage on streamed requests.
+
+    Returns the (possibly rewritten) body, whether the request streams, and
+    whether usage chunks must be stripped because the client did not ask.
+    """
+    try:
+        body_json = json.loads(body)
+    except ValueError:
+        return body, False, False
+    if not isinstance(body_json, dict) or not body_json.get("stream"):
+        return body, False, False
+
+    stream_options = body_json.get("stream_options") or {}
+    if stream_options.get("include_usage"):
+        return body, True, False
+
+    body_json["stream_options"] = {**stream_options, "include_usage": True}
+    return json.dumps(body_json).encode("utf-8"), True, True
+
+
+def request_model(body: bytes) -> str:
+    try:
+        return json.loads(body).get("model") or "unknown"
+    except (ValueError, AttributeError):
+        return "unknown"
+
+
+def client_id(request: Request) -> str:
+    """Identify the caller by host and user-agent product, e.g. '127.0.0.1 GitHubCopilotChat'."""
+    host = request.client.host if request.client else "unknown"
+    product = request.headers.get("user-agent", "unknown").split("/")[0].split(" ")[0]
+    return f"{host} {product}"
+
+
+class UsageTracker:
+    """Pulls the usage block out of a response as it streams through.
+
+    For streamed responses, `feed` returns the bytes to forward to the client,
+    with the trailing usage-only event removed when `strip_usage` is set.
+    """
+
+    def __init__(self, streaming: bool, strip_usage: bool):
+        self.streaming = streaming
+        self.strip_usage = strip_usage
+        self.usage: Optional[Dict] = None
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        if not self.streaming:
+            return chunk
+
+        # Only complete events are forwarded; upstream flushes one event per
+        # chunk, so this holds nothing back in practice.
+        *events, self._buffer = self._buffer.split(b"\n\n")
+        return b"".join(self._event(event + b"\n\n") for event in events)
+
+    def close(self) -> bytes:
+        tail, self._buffer = self._buffer, b""
+        if not self.streaming:
+            self._parse(tail)
+            return b""
+        return self._event(tail) if tail else b""
+
+    def _event(self, event: bytes) -> bytes:
+        if b'"usage"' not in event:
+            return event
+        payload = event.strip()
+        if payload.startswith(b"data:"):
+            payload = payload[len(b"data:"):]
+        parsed = self._parse(payload)
+        if self.strip_usage and parsed is not None and not parsed.get("choices"):
+            return b""
+        return event
+
+    def _parse(self, payload: bytes) -> Optional[Dict]:
+        try:
+            parsed = json.loads(payload)
+        except ValueError:
+            return None
+        if isinstance(parsed, dict) and parsed.get("usage"):
+            self.usage = parsed["usage"]
+        return parsed if isinstance(parsed, dict) else None
+
+
+def _empty_totals() -> Dict:
+    return {
+        "requests": 0,
+        "requests_without_usage": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "generation_seconds": 0.0,
+    }
+
+
+class UsageLedger:
+    """In-memory per-model and per-client token totals, flushed to disk."""
+
+    def __init__(self, path: pathlib.Path = USAGE_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.models: Dict[str, Dict] = defaultdict(_empty_totals)
+        self.clients: Dict[str, Dict] = defaultdict(_empty_totals)
+
+    def record(self, model: str, client: str, usage: Optional[Dict], generation_seconds: float) -> None:
+        """Add one request; its time only counts towards throughput if its tokens are known."""
+        usage = usage or {}
+        completion_tokens = usage.get("completion_tokens")
+        with self._lock:
+            for totals in (self.models[model], self.clients[client]):
+                totals["requests"] += 1
+                totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                if completion_tokens is None:
+                    totals["requests_without_usage"] += 1
+                else:
+                    totals["completion_tokens"] += completion_tokens
+                    totals["generation_seconds"] += generation_seconds
+            self._dirty = True
+
+    @staticmethod
+    def _with_throughput(totals: Dict) -> Dict:
+        seconds = totals["generation_seconds"]
+        return {
+            **totals,
+            "total_tokens": totals["prompt_tokens"] + totals["completion_tokens"],
+            "tokens_per_second": totals["completion_tokens"] / seconds if seconds else 0.0,
+        }
+
+    def totals(self, model: Optional[str] = None, client: Optional[str] = None) -> Dict:
+        with self._lock:
+            models = {k: self._with_throughput(v) for k, v in self.models.items()
+                      if model is None or k == model}
+            clients = {k: self._with_throughput(v) for k, v in self.clients.items()
+                       if client is None or k == client}
+        return {"models": models, "clients": clients}
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        data = json.loads(self.path.read_text())
+        with self._lock:
+            for name, section in (("models", self.models), ("clients", self.clients)):
+                for key, totals in data.get(name, {}).items():
+                    section[key].update({k: totals[k] for k in _empty_totals() if k in totals})
+
+    def flush(self) -> bool:
+        """Write the ledger to disk if it changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {
+                "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "models": dict(self.models),
+                "clients": dict(self.clients),
+            }
+            payload = json.dumps(data, indent=2)
+            self._dirty = False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(payload)
+        os.replace(tmp_path, self.path)
+        return True
+
@@ -1,5 +1,6 @@
 
 
+import codecs
 import json
 import pathlib
 import sys
@@ -8,10 +9,13 @@ import time
 import colorama
 import yaml
 from fastapi import Request
-from httpx import Response
 
+from proxy.tracing import tracer
 
-def log_request(request: Request, body: bytes) -> None:
+
+@tracer.traced("log_request")
+def log_request(request: Request, body: bytes) -> str:
+    """Write the request to logs/requests and return the log file name."""
     request_log = {
         "method": request.method,
         "url": str(request.url),
@@ -24,8 +28,15 @@ def log_request(request: Request, body: bytes) -> None:
 
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     log_file = log_dir / f"request_{timestamp}.yaml"
+    # Requests within the same second get a numbered suffix instead of overwriting
+    suffix = 1
+    while log_file.exists():
+        log_file = log_dir / f"request_{timestamp}_{suffix}.yaml"
+        suffix += 1
     log_file.write_text(yaml.dump(request_log))
+    return log_file.name
 
+@tracer.traced("print_request_messages")
 def print_request_messages(body: bytes) -> None:
     body_json = json.loads(body)
     for message in body_json["messages"]:
@@ -38,18 +49,50 @@ def print_request_messages(body: bytes) -> None:
         else:
             print(yaml.dump(message))
 
-def print_response_chunks(response: Response) -> None:
-    responses = [r.lstrip('data: ') for r in response.iter_lines() if r]
-    responses.pop()  # Remove the [DONE] line
-    responses_json = [json.loads(r) for r in responses]
+def print_response_line(line: str) -> None:
+    """Print the token carried by a single SSE line of a chat completion stream."""
+    line = line.strip()
+    if not line.startswith("data:"):
+        return
+    payload = line[len("data:"):].strip()
+    if payload == "[DONE]":
+        return
+    r = json.loads(payload)
+    try:
+        if r['choices']:
+            token = r['choices'][0]['delta']['content']
+            print(token, end='', flush=True)
+    except (IndexError, KeyError):
+        print("\n\nERROR: Unexpected response format", file=sys.stderr)
+        print(yaml.dump(r))
+
+class ResponsePrinter:
+    """Prints tokens from a streamed response as raw chunks arrive."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._started = False
+
+    def feed(self, chunk: bytes) -> None:
+        if not self._started:
+            print(colorama.Fore.GREEN)
+            self._started = True
+        self._buffer += self._decoder.decode(chunk)
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._print_line(line)
+
+    def close(self) -> None:
+        self._buffer += self._decoder.decode(b"", final=True)
+        if self._buffer:
+            self._print_line(self._buffer)
+            self._buffer = ""
+        print(colorama.Style.RESET_ALL)
 
-    print(colorama.Fore.GREEN)
-    for r in responses_json:
+    @staticmethod
+    def _print_line(line: str) -> None:
         try:
-            if r['choices']:
-                token = r['choices'][0]['delta']['content']
-                print(token, end='', flush=True)
-        except (IndexError, KeyError):
-            print("\n\nERROR: Unexpected response format", file=sys.stderr)
-            print(yaml.dump(r))
-    print(colorama.Style.RESET_ALL)
\ No newline at end of file
+            print_response_line(line)
+        except json.JSONDecodeError:
+            print(line)
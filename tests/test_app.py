@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from starlette.requests import ClientDisconnect
+
+import proxy.app as proxy_app
+from proxy.request_store import RequestStore
+
+
+class EndlessStream(httpx.AsyncByteStream):
+    """An upstream that keeps generating until it is closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        while True:
+            yield b'data: {"choices": [{"index": 0, "delta": {"content": "x"}}]}\n\n'
+            await asyncio.sleep(0.01)
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+def test_client_disconnect_mid_stream_runs_cleanup(spec_version, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(proxy_app, "request_store", RequestStore(tmp_path / "requests.db"))
+
+    upstream_stream = EndlessStream()
+    gui_calls = []
+
+    async def handler(request):
+        if request.url.path == "/v1/chat/completions":
+            return httpx.Response(200, stream=upstream_stream)
+        gui_calls.append(request.url.path)
+        return httpx.Response(200, json={})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(httpx, "AsyncClient",
+                        lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs))
+
+    body = json.dumps({"model": "m", "messages": [{"role": "user", "content": "hi"}], "stream": True}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": spec_version},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/chat/completions",
+        "raw_path": b"/v1/chat/completions",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8001),
+    }
+
+    async def run():
+        first_chunk = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                if first_chunk.is_set() and spec_version == "2.4":
+                    raise OSError("client went away")
+                first_chunk.set()
+
+        try:
+            await asyncio.wait_for(proxy_app.app(scope, receive, send), timeout=5)
+        except ClientDisconnect:
+            pass
+
+        # Checked before asyncio.run() finalises any suspended generators
+        assert gui_calls[-1] == "/stop"
+        assert upstream_stream.closed
+        assert proxy_app.request_store.aggregate()[0]["requests"] == 1
+        assert proxy_app.request_store.import_yaml_logs(tmp_path / "logs" / "requests") == 0
+
+    asyncio.run(run())
+
+
+def test_malformed_responses_request_returns_400():
+    async def run():
+        transport = httpx.ASGITransport(app=proxy_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+            return await client.post("/v1/responses", json={"model": "m", "input": ["hi"]})
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 400
+    assert response.json()["error"]["type"] == "invalid_request_error"
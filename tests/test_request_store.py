@@ -0,0 +1,69 @@
+import json
+
+import pytest
+import yaml
+from starlette.requests import Request
+
+from proxy.request_store import RequestStore, main
+from proxy.utils import log_request
+
+
+def _body(model, messages):
+    return json.dumps({"model": model, "messages": [{"role": "user", "content": m} for m in messages]}).encode()
+
+
+def test_aggregate_by_model_and_hour(tmp_path):
+    store = RequestStore(tmp_path / "requests.db")
+    store.record(_body("granite", ["hi"]), timestamp=3600 * 10, status=200, ttft=0.2, duration=1.0)
+    store.record(_body("granite", ["hi", "again"]), timestamp=3600 * 10 + 5, status=200, ttft=0.4, duration=3.0)
+    store.record(_body("granite", ["late"]), timestamp=3600 * 11, status=504, duration=5.0)
+    store.record(_body("Qwen/Qwen3-32B", ["hi"]), timestamp=3600 * 10, status=200, ttft=1.0, duration=2.0)
+
+    rows = store.aggregate(model="granite", group_by="hour")
+
+    assert [(row["bucket"], row["requests"], row["errors"]) for row in rows] == [(36000, 2, 0), (39600, 1, 1)]
+    assert rows[0]["avg_messages"] == 1.5
+    assert abs(rows[0]["avg_ttft"] - 0.3) < 1e-9
+    assert [row["model"] for row in store.aggregate(since=3600 * 10 + 1)] == ["granite"]
+
+
+def test_bodies_are_loaded_lazily_and_yaml_logs_import(tmp_path, capsys):
+    log_dir = tmp_path / "requests"
+    log_dir.mkdir()
+    body = _body("granite", ["hello"])
+    (log_dir / "request_20251020_101500.yaml").write_text(yaml.dump({"body": body.decode()}))
+
+    db = tmp_path / "requests.db"
+    main(["--db", str(db), "import", str(log_dir)])
+    main(["--db", str(db), "import", str(log_dir)])
+    main(["--db", str(db), "summary"])
+    main(["--db", str(db), "body", "1"])
+
+    out = capsys.readouterr().out
+    assert "Imported 1 request logs" in out
+    assert "Imported 0 request logs" in out
+    assert "model=granite  requests=1" in out
+    assert RequestStore(db).body(1) == body
+
+
+def test_live_record_is_not_imported_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    request = Request({"type": "http", "method": "POST", "path": "/v1/chat/completions",
+                       "query_string": b"", "headers": [], "server": ("proxy", 8001)})
+    body = _body("granite", ["hello"])
+    store = RequestStore(tmp_path / "requests.db")
+
+    log_files = [log_request(request, body) for _ in range(2)]
+    for log_file in log_files:
+        store.record(body, timestamp=0, status=200, source=log_file)
+
+    assert len(set(log_files)) == 2
+    assert store.import_yaml_logs(tmp_path / "logs" / "requests") == 0
+    assert store.aggregate()[0]["requests"] == 2
+
+
+def test_invalid_since_is_a_usage_error(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(["--db", str(tmp_path / "requests.db"), "summary", "--since", "24"])
+
+    assert "invalid window '24'" in capsys.readouterr().err
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+
+from proxy.responses import ConversationStore, ResponsesRequestError, translate_request
+
+
+def _chat_stream(*chunks):
+    events = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"]
+    return "".join(events).encode()
+
+
+def _events(output):
+    return [json.loads(event.split("\ndata: ", 1)[1]) for event in output.decode().split("\n\n") if event]
+
+
+def test_translate_request_builds_streaming_chat_body():
+    body = json.dumps({
+        "model": "Qwen/Qwen3-32B",
+        "instructions": "Be brief.",
+        "input": [
+            {"role": "developer", "content": [{"type": "input_text", "text": "Use tools."}]},
+            {"type": "function_call", "call_id": "call_1", "name": "ls", "arguments": "{}"},
+            {"type": "function_call_output", "call_id": "call_1", "output": "a.py"},
+        ],
+        "tools": [{"type": "function", "name": "ls", "parameters": {"type": "object"}}],
+        "max_output_tokens": 64,
+    }).encode()
+
+    chat_body, _ = translate_request(body, ConversationStore())
+    chat = json.loads(chat_body)
+
+    assert chat["stream"] and chat["stream_options"] == {"include_usage": True}
+    assert chat["max_tokens"] == 64
+    assert chat["tools"] == [{"type": "function", "function": {"name": "ls", "parameters": {"type": "object"}}}]
+    assert [m["role"] for m in chat["messages"]] == ["system", "system", "assistant", "tool"]
+    assert chat["messages"][2]["tool_calls"][0]["id"] == "call_1"
+
+
+def test_streamed_tool_call_is_translated_and_conversation_stored():
+    store = ConversationStore()
+    body = json.dumps({"model": "m", "input": "list files", "stream": True}).encode()
+    _, translator = translate_request(body, store)
+
+    stream = _chat_stream(
+        {"choices": [{"index": 0, "delta": {"content": "Sure."}}]},
+        {"choices": [{"index": 0, "delta": {"tool_calls": [
+            {"index": 0, "id": "call_9", "function": {"name": "ls", "arguments": "{\"pa"}}]}}]},
+        {"choices": [{"index": 0, "delta": {"tool_calls": [
+            {"index": 0, "function": {"arguments": "th\": \".\"}"}}]}, "finish_reason": "tool_calls"}]},
+        {"choices": [], "usage": {"prompt_tokens": 9, "completion_tokens": 4, "total_tokens": 13}},
+    )
+    output = b"".join(translator.feed(stream[i:i + 16]) for i in range(0, len(stream), 16))
+    events = _events(output + translator.close())
+
+    types = [event["type"] for event in events]
+    assert types[:2] == ["response.created", "response.in_progress"]
+    assert types[-1] == "response.completed"
+    assert [event["sequence_number"] for event in events] == list(range(len(events)))
+    assert "".join(e["delta"] for e in events if e["type"] == "response.function_call_arguments.delta") == '{"path": "."}'
+
+    completed = events[-1]["response"]
+    assert [item["type"] for item in completed["output"]] == ["message", "function_call"]
+    assert completed["usage"]["total_tokens"] == 13
+
+    follow_up = json.dumps({
+        "model": "m",
+        "previous_response_id": completed["id"],
+        "input": [{"type": "function_call_output", "call_id": "call_9", "output": "a.py"}],
+    }).encode()
+    chat = json.loads(translate_request(follow_up, store)[0])
+    assert [m["role"] for m in chat["messages"]] == ["user", "assistant", "tool"]
+    assert chat["messages"][1]["tool_calls"][0]["function"]["arguments"] == '{"path": "."}'
+
+
+def test_store_is_bounded_and_unknown_previous_response_is_rejected():
+    store = ConversationStore(max_entries=2)
+    for i in range(3):
+        store.put(f"resp_{i}", [{"role": "user", "content": str(i)}])
+
+    assert len(store) == 2
+    assert store.get("resp_0") is None
+
+    body = json.dumps({"model": "m", "input": "hi", "previous_response_id": "resp_0"}).encode()
+    with pytest.raises(ResponsesRequestError) as error:
+        translate_request(body, store)
+    assert error.value.code == "previous_response_not_found"
+
+
+@pytest.mark.parametrize("request_fields", [
+    {"input": ["hi"]},
+    {"input": {"role": "user"}},
+    {"input": [{"role": "user", "content": [{"type": "input_text"}]}]},
+    {"input": [{"role": "robot", "content": "hi"}]},
+    {"input": [{"type": "function_call", "name": "ls", "arguments": "{}"}]},
+    {"input": [{"type": "function_call_output", "output": "a.py"}]},
+    {"input": "hi", "tools": [{"type": "function", "parameters": {}}]},
+    {"input": "hi", "tools": "ls"},
+    {"input": "hi", "tool_choice": {"type": "function"}},
+    {"input": "hi", "text": {"format": "json"}},
+    {"input": "hi", "previous_response_id": ["resp_1"]},
+])
+def test_malformed_requests_raise_request_error(request_fields):
+    body = json.dumps({"model": "m", **request_fields}).encode()
+
+    with pytest.raises(ResponsesRequestError):
+        translate_request(body, ConversationStore())
+
+
+def test_stream_cut_off_before_done_fails_and_is_not_stored():
+    store = ConversationStore()
+    body = json.dumps({"model": "m", "input": "hi", "stream": True}).encode()
+    _, translator = translate_request(body, store)
+
+    output = translator.feed(b'data: {"choices": [{"index": 0, "delta": {"content": "Half an"}}]}\n\n')
+    events = _events(output + translator.close())
+
+    assert events[-1]["type"] == "response.failed"
+    assert events[-1]["response"]["output"][0]["status"] == "incomplete"
+    assert len(store) == 0
+
+
+def test_empty_output_is_stored_with_empty_content():
+    store = ConversationStore()
+    body = json.dumps({"model": "m", "input": "hi"}).encode()
+    _, translator = translate_request(body, store)
+
+    translator.feed(_chat_stream({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+    response = json.loads(translator.close())
+
+    assert response["status"] == "completed"
+    assert store.get(response["id"])[-1] == {"role": "assistant", "content": ""}
@@ -0,0 +1,41 @@
+import json
+
+from proxy.tracing import NOOP_SPAN, SpanExporter, Tracer
+
+
+def test_unsampled_trace_is_noop(tmp_path):
+    tracer = Tracer(sample_rate=0.0, exporter=SpanExporter(tmp_path / "traces.jsonl"))
+
+    root = tracer.start_trace("request", traceparent="00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+
+    assert root is NOOP_SPAN
+    with root.activate():
+        assert tracer.span("child") is NOOP_SPAN
+
+
+def test_spans_are_exported_as_otlp_json(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, exporter=SpanExporter(path, interval=60))
+
+    @tracer.traced("log_request")
+    def log_request():
+        pass
+
+    root = tracer.start_trace("request")
+    with root.activate():
+        log_request()
+        with tracer.span("gui.reset", attempt=1):
+            pass
+    root.end()
+
+    tracer.exporter.shutdown()
+
+    lines = path.read_text().splitlines()
+    spans = [span for line in lines
+             for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+    by_name = {span["name"]: span for span in spans}
+    assert set(by_name) == {"request", "log_request", "gui.reset"}
+    assert by_name["log_request"]["parentSpanId"] == by_name["request"]["spanId"]
+    assert by_name["gui.reset"]["traceId"] == by_name["request"]["traceId"]
+    assert by_name["gui.reset"]["attributes"] == [{"key": "attempt", "value": {"intValue": "1"}}]
+    assert "parentSpanId" not in by_name["request"]
@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+
+from proxy.upstream import Upstream, UpstreamConfig
+
+
+class SlowStream(httpx.AsyncByteStream):
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.delay)
+        for chunk in self.chunks:
+            yield chunk
+
+
+async def _read(upstream, client):
+    stream = await upstream.open_stream(client, "POST", "http://upstream/v1/chat/completions",
+                                        content=b"{}", headers={})
+    body = b"".join([chunk async for chunk in stream])
+    await stream.aclose()
+    return stream.status_code, body
+
+
+def test_retries_connect_error_before_first_byte():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, content=b"data: [DONE]\n\n")
+
+    async def run():
+        upstream = Upstream(UpstreamConfig(retry_backoff=0))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            result = await _read(upstream, client)
+        return upstream, result
+
+    upstream, (status, body) = asyncio.run(run())
+
+    assert status == 200
+    assert body == b"data: [DONE]\n\n"
+    assert upstream.stats.retries == 1
+    assert upstream.stats.snapshot()["retry_rate"] == 1.0
+
+
+def test_first_token_timeout_is_retried():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        delay = 1.0 if len(calls) == 1 else 0
+        return httpx.Response(200, stream=SlowStream([b"ok"], delay))
+
+    async def run():
+        upstream = Upstream(UpstreamConfig(first_token_timeout=0.05, retry_backoff=0))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return upstream, await _read(upstream, client)
+
+    upstream, (status, body) = asyncio.run(run())
+
+    assert body == b"ok"
+    assert len(calls) == 2
+    assert upstream.stats.retries == 1
+
+
+def test_slow_request_is_hedged_and_hedge_wins():
+    async def handler(request):
+        delay = 1.0 if request.url.host == "upstream" else 0
+        return httpx.Response(200, stream=SlowStream([request.url.host.encode()], delay))
+
+    async def run():
+        config = UpstreamConfig(hedge_percentile=95, hedge_min_samples=1, hedge_url="http://hedge/v1")
+        upstream = Upstream(config)
+        upstream.stats.record_ttft(0.01)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return upstream, await _read(upstream, client)
+
+    upstream, (status, body) = asyncio.run(run())
+
+    assert body == b"hedge"
+    assert upstream.stats.hedges == 1
+    assert upstream.stats.hedge_wins == 1
+    assert upstream.stats.retries == 0
+
+
+def test_slow_non_streamed_response_is_not_timed_out_or_hedged():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(200, stream=SlowStream([b'{"choices": []}'], 0.2))
+
+    async def run():
+        config = UpstreamConfig(first_token_timeout=0.05, hedge_percentile=95, hedge_min_samples=1)
+        upstream = Upstream(config)
+        upstream.stats.record_ttft(0.01)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            stream = await upstream.open_stream(client, "POST", "http://upstream/v1/chat/completions",
+                                                content=b"{}", headers={}, streaming=False)
+            body = b"".join([chunk async for chunk in stream])
+            await stream.aclose()
+        return upstream, body
+
+    upstream, body = asyncio.run(run())
+
+    assert body == b'{"choices": []}'
+    assert len(calls) == 1
+    assert upstream.stats.retries == 0 and upstream.stats.hedges == 0
+    assert list(upstream.stats.ttft_samples) == [0.01]
@@ -0,0 +1,52 @@
+import json
+
+from proxy.usage import UsageLedger, UsageTracker, request_usage
+
+
+def _event(payload):
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def test_request_usage_injects_and_strips_when_client_did_not_ask():
+    body = json.dumps({"model": "Qwen/Qwen3-32B", "stream": True, "messages": []}).encode()
+
+    upstream_body, streaming, strip_usage = request_usage(body)
+
+    assert json.loads(upstream_body)["stream_options"] == {"include_usage": True}
+    assert streaming and strip_usage
+
+    body = json.dumps({"stream": True, "stream_options": {"include_usage": True}}).encode()
+    assert request_usage(body) == (body, True, False)
+
+
+def test_tracker_strips_usage_event_split_across_chunks():
+    token = _event({"choices": [{"index": 0, "delta": {"content": "Hi"}}]})
+    usage = _event({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2}})
+    stream = token + usage + b"data: [DONE]\n\n"
+
+    tracker = UsageTracker(streaming=True, strip_usage=True)
+    forwarded = b"".join(tracker.feed(stream[i:i + 7]) for i in range(0, len(stream), 7))
+    forwarded += tracker.close()
+
+    assert forwarded == token + b"data: [DONE]\n\n"
+    assert tracker.usage == {"prompt_tokens": 5, "completion_tokens": 2}
+
+
+def test_ledger_aggregates_and_flushes(tmp_path):
+    ledger = UsageLedger(tmp_path / "usage.json")
+    ledger.record("granite", "127.0.0.1 copilot", {"prompt_tokens": 10, "completion_tokens": 4}, 2.0)
+    ledger.record("granite", "127.0.0.1 spam", {"prompt_tokens": 6, "completion_tokens": 4}, 2.0)
+    ledger.record("granite", "127.0.0.1 spam", None, 30.0)  # disconnected before the usage chunk
+
+    totals = ledger.totals()
+    assert totals["models"]["granite"]["total_tokens"] == 24
+    assert totals["models"]["granite"]["tokens_per_second"] == 2.0
+    assert totals["models"]["granite"]["requests_without_usage"] == 1
+    assert set(totals["clients"]) == {"127.0.0.1 copilot", "127.0.0.1 spam"}
+
+    assert ledger.flush()
+    assert not ledger.flush()
+
+    reloaded = UsageLedger(tmp_path / "usage.json")
+    reloaded.load()
+    assert reloaded.totals() == totals